@@ -0,0 +1,75 @@
+"""
+Cache Helper Functions
+
+Thin Redis cache for hot, rarely-changing read endpoints.
+Caching is disabled when REDIS_URL is not set; every helper then becomes a no-op.
+Redis errors are logged and treated as cache misses so reads fall through to MongoDB.
+
+Keys are scoped by a per-namespace generation counter. Build the key with cache_key()
+*before* reading MongoDB: cache_invalidate() bumps the generation, so a reader that
+raced an admin write stores its stale result under the retired generation, where it
+is never read again and simply expires.
+"""
+
+import logging
+from typing import Any, Optional
+import orjson
+from redis import asyncio as aioredis
+
+from settings import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 30
+
+_redis = None
+
+if REDIS_URL:
+    _redis = aioredis.from_url(REDIS_URL)
+
+
+async def cache_key(namespace: str, *parts: Any) -> Optional[str]:
+    """Return the key for parts under namespace's current generation, or None if caching is off."""
+    if _redis is None:
+        return None
+    try:
+        generation = await _redis.get(f"{namespace}:gen")
+    except Exception as e:
+        logger.warning("Cache generation lookup failed for %s: %s", namespace, e)
+        return None
+    return f"{namespace}:{int(generation or 0)}:" + orjson.dumps(parts).decode()
+
+
+async def cache_get(key: Optional[str]) -> Optional[bytes]:
+    """Return the cached JSON bytes for key, or None on a miss."""
+    if key is None:
+        return None
+    try:
+        return await _redis.get(key)
+    except Exception as e:
+        logger.warning("Cache get failed for %s: %s", key, e)
+        return None
+
+
+async def cache_set(key: Optional[str], value: Any, ttl: int = DEFAULT_TTL) -> None:
+    if key is None:
+        return
+    try:
+        await _redis.setex(key, ttl, orjson.dumps(value, default=str))
+    except Exception as e:
+        logger.warning("Cache set failed for %s: %s", key, e)
+
+
+async def cache_invalidate(namespace: str) -> None:
+    """Retire every key in namespace by bumping its generation; old entries age out via TTL."""
+    if _redis is None:
+        return
+    try:
+        await _redis.incr(f"{namespace}:gen")
+    except Exception as e:
+        logger.warning("Cache invalidation failed for %s: %s", namespace, e)
+
+
+async def close_cache() -> None:
+    if _redis is not None:
+        await _redis.aclose()
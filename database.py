@@ -3,28 +3,50 @@ Database Helper Functions
 
 MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
+All CRUD helpers are coroutines backed by the Motor async driver; await them.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
 from datetime import datetime, timezone
-import os
-from dotenv import load_dotenv
+import logging
+import time
 from typing import Union, Optional, Dict, Any, List
 from pydantic import BaseModel
 
-# Load environment variables from .env file
-load_dotenv()
+from settings import DATABASE_URL, DATABASE_NAME
+
+logger = logging.getLogger(__name__)
+
+_UTC = timezone.utc
 
 _client = None
 db = None
 
-database_url = os.getenv("DATABASE_URL")
-database_name = os.getenv("DATABASE_NAME")
+if DATABASE_URL and DATABASE_NAME:
+    _client = AsyncIOMotorClient(
+        DATABASE_URL,
+        maxPoolSize=200,
+        minPoolSize=10,
+        maxIdleTimeMS=300000,
+        compressors="zstd,snappy",
+        retryWrites=True,
+        w=1,
+    )
+    db = _client[DATABASE_NAME]
+
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+_COLLS = {}
+
+
+def _coll(name: str):
+    # Reuse collection handles instead of building a new one on every db[name]
+    c = _COLLS.get(name)
+    if c is None:
+        c = _COLLS[name] = db[name]
+    return c
 
 
 def _ensure_db():
@@ -32,6 +54,102 @@ def _ensure_db():
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
 
+def close_pool():
+    """Close the client and release every pooled connection (call on app shutdown)."""
+    if _client is not None:
+        _client.close()
+
+
+# Case-insensitive comparison; queries must pass the same collation to use the title index
+CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
+# Index specs per collection: (keys, create_index options)
+INDEXES = {
+    "user": [
+        ("email", {"unique": True}),
+    ],
+    "fooditem": [
+        # Equality prefix then _id so keyset pages of /items are read in index order, no in-memory sort
+        ([("is_available", 1), ("category_id", 1), ("_id", -1), ("price", 1)], {}),
+        ([("title", "text"), ("description", "text"), ("tags", "text")], {}),
+        ("title_lc", {}),
+        ("title", {"collation": CASE_INSENSITIVE}),
+        ("tags", {}),
+    ],
+    "order": [
+        ([("user_id", 1), ("_id", -1)], {}),
+    ],
+    "category": [
+        ([("is_active", 1), ("name", 1)], {}),
+    ],
+}
+
+
+# Collections confirmed to carry a text index, filled in by ensure_indexes() and
+# re-checked lazily by has_text_index(). INDEXES always requests the fooditem text index,
+# so on a healthy deployment list_items uses $text; the title_lc/tags prefix fallback
+# only runs while that index is missing (e.g. it could not be built yet).
+_text_indexed = set()
+
+# Seconds between re-checks for a collection still lacking a text index
+TEXT_INDEX_RECHECK_S = 60
+_text_index_last_check = {}
+
+
+async def _refresh_text_index(collection_name: str) -> None:
+    _text_index_last_check[collection_name] = time.monotonic()
+    try:
+        info = await _coll(collection_name).index_information()
+    except Exception:
+        return
+    if any(kind == "text" for index in info.values() for _, kind in index["key"]):
+        _text_indexed.add(collection_name)
+
+
+async def _backfill_search_fields():
+    # One-shot: items written before title_lc existed get it (and lowercased tags) added
+    await _coll("fooditem").update_many(
+        {"title_lc": {"$exists": False}},
+        [{"$set": {
+            "title_lc": {"$toLower": "$title"},
+            "tags": {"$map": {"input": {"$ifNull": ["$tags", []]}, "in": {"$toLower": "$$this"}}},
+        }}],
+    )
+
+
+async def ensure_indexes():
+    """Create the indexes backing the API's filters and sorts (idempotent, call on startup)."""
+    if db is None:
+        return
+    # Probe once so an unreachable server costs one selection timeout, not one per step below
+    try:
+        await db.command("ping")
+    except Exception as e:
+        logger.warning("Skipping index setup, database unreachable: %s", e)
+        return
+    try:
+        await _backfill_search_fields()
+    except Exception as e:
+        logger.warning("Could not backfill fooditem search fields: %s", e)
+    for collection_name, specs in INDEXES.items():
+        for keys, options in specs:
+            try:
+                await _coll(collection_name).create_index(keys, **options)
+            except Exception as e:
+                logger.warning("Could not create index %s on %s: %s", keys, collection_name, e)
+        await _refresh_text_index(collection_name)
+
+
+async def has_text_index(collection_name: str) -> bool:
+    """Whether collection_name has a text index; a miss is re-checked at most every TEXT_INDEX_RECHECK_S."""
+    if collection_name in _text_indexed:
+        return True
+    last = _text_index_last_check.get(collection_name)
+    if db is not None and (last is None or time.monotonic() - last >= TEXT_INDEX_RECHECK_S):
+        await _refresh_text_index(collection_name)
+    return collection_name in _text_indexed
+
+
 def _to_dict(data: Union[BaseModel, dict]) -> dict:
     if isinstance(data, BaseModel):
         return data.model_dump()
@@ -40,49 +158,102 @@ def _to_dict(data: Union[BaseModel, dict]) -> dict:
 
 # CRUD helpers
 
-def create_document(collection_name: str, data: Union[BaseModel, dict]) -> str:
+async def create_document(collection_name: str, data: Union[BaseModel, dict], now: Optional[datetime] = None) -> str:
     _ensure_db()
     payload = _to_dict(data)
-    now = datetime.now(timezone.utc)
+    if now is None:
+        now = datetime.now(_UTC)
     payload['created_at'] = now
     payload['updated_at'] = now
-    result = db[collection_name].insert_one(payload)
+    result = await _coll(collection_name).insert_one(payload)
     return str(result.inserted_id)
 
 
-def get_documents(collection_name: str, filter_dict: Optional[dict] = None, limit: Optional[int] = None, sort: Optional[list] = None) -> List[dict]:
+async def create_document_if_absent(collection_name: str, filter_dict: dict, data: Union[BaseModel, dict], now: Optional[datetime] = None) -> Optional[str]:
+    """Insert data only if nothing matches filter_dict, in one upsert; return the new id or None."""
+    _ensure_db()
+    payload = _to_dict(data)
+    if now is None:
+        now = datetime.now(_UTC)
+    payload['created_at'] = now
+    payload['updated_at'] = now
+    try:
+        result = await _coll(collection_name).update_one(filter_dict, {"$setOnInsert": payload}, upsert=True)
+    except DuplicateKeyError:
+        # Lost a race against a concurrent insert of the same unique key
+        return None
+    return str(result.upserted_id) if result.upserted_id is not None else None
+
+
+async def create_documents(collection_name: str, items: List[Union[BaseModel, dict]], now: Optional[datetime] = None) -> List[str]:
     _ensure_db()
-    cursor = db[collection_name].find(filter_dict or {})
+    if now is None:
+        now = datetime.now(_UTC)
+    docs = [{**_to_dict(x), 'created_at': now, 'updated_at': now} for x in items]
+    result = await _coll(collection_name).insert_many(docs, ordered=False)
+    return [str(x) for x in result.inserted_ids]
+
+
+async def get_documents(collection_name: str, filter_dict: Optional[dict] = None, limit: Optional[int] = None, sort: Optional[list] = None, projection: Optional[dict] = None, collation: Optional[dict] = None) -> List[dict]:
+    _ensure_db()
+    cursor = _coll(collection_name).find(filter_dict or {}, projection, collation=collation)
     if sort:
         cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(int(limit))
-    return [serialize_doc(doc) for doc in cursor]
+    docs = await cursor.to_list(length=None)
+    # The driver hands back fresh dicts, so stringify in place without serialize_doc's copy;
+    # guard on _id since a projection may exclude it
+    for doc in docs:
+        if "_id" in doc:
+            doc["_id"] = str(doc["_id"])
+    return docs
 
 
-def get_document_by_id(collection_name: str, _id: str) -> Optional[dict]:
+async def get_document(collection_name: str, filter_dict: dict, projection: Optional[dict] = None) -> Optional[dict]:
     _ensure_db()
-    try:
-        doc = db[collection_name].find_one({"_id": ObjectId(_id)})
-        return serialize_doc(doc) if doc else None
-    except Exception:
+    doc = await _coll(collection_name).find_one(filter_dict, projection)
+    return serialize_doc(doc) if doc else None
+
+
+async def get_document_by_id(collection_name: str, _id: str) -> Optional[dict]:
+    _ensure_db()
+    if not ObjectId.is_valid(_id):
         return None
+    doc = await _coll(collection_name).find_one({"_id": ObjectId(_id)})
+    return serialize_doc(doc) if doc else None
 
 
-def update_document(collection_name: str, _id: str, update_data: Dict[str, Any]) -> bool:
+async def update_document(collection_name: str, _id: str, update_data: Dict[str, Any], now: Optional[datetime] = None) -> bool:
     _ensure_db()
+    if not ObjectId.is_valid(_id):
+        return False
     update = {"$set": _to_dict(update_data)}
-    update["$set"]["updated_at"] = datetime.now(timezone.utc)
-    result = db[collection_name].update_one({"_id": ObjectId(_id)}, update)
+    update["$set"]["updated_at"] = now if now is not None else datetime.now(_UTC)
+    result = await _coll(collection_name).update_one({"_id": ObjectId(_id)}, update)
     return result.modified_count > 0
 
 
-def delete_document(collection_name: str, _id: str) -> bool:
+async def delete_document(collection_name: str, _id: str) -> bool:
     _ensure_db()
-    result = db[collection_name].delete_one({"_id": ObjectId(_id)})
+    if not ObjectId.is_valid(_id):
+        return False
+    result = await _coll(collection_name).delete_one({"_id": ObjectId(_id)})
     return result.deleted_count > 0
 
 
+async def next_sequence(name: str) -> int:
+    """Atomically increment and return the named counter in the counters collection."""
+    _ensure_db()
+    doc = await _coll("counters").find_one_and_update(
+        {"_id": name},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["seq"]
+
+
 # Utility
 
 def serialize_doc(doc: Optional[dict]) -> Optional[dict]:
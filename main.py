@@ -1,15 +1,22 @@
 import os
+import re
+import asyncio
+import operator
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, EmailStr, TypeAdapter
 from bson import ObjectId
 from passlib.context import CryptContext
 
-from database import db, create_document, get_documents, get_document_by_id, update_document, delete_document
+from settings import DATABASE_URL, DATABASE_NAME
+from database import CASE_INSENSITIVE, db, close_pool, ensure_indexes, has_text_index, create_document, create_document_if_absent, create_documents, get_documents, get_document, get_document_by_id, update_document, delete_document, next_sequence
+from cache import cache_key, cache_get, cache_set, cache_invalidate, close_cache
 from schemas import User, Category, Fooditem, Order
 
-app = FastAPI(title="Food Court Ordering API", version="1.0.0")
+
+app = FastAPI(title="Food Court Ordering API", version="1.0.0", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,7 +26,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_background_tasks = set()
+
+
+@app.on_event("startup")
+async def startup_event():
+    # Index setup runs in the background so the server accepts requests (incl. /test) right away
+    task = asyncio.create_task(ensure_indexes())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    close_pool()
+    await close_cache()
+
+
+# 10 bcrypt rounds (passlib defaults to 12) keeps demo-auth hashing ~4x cheaper
+pwd_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=10, deprecated="auto")
 
 
 # ============ Auth models (simple tokenless demo auth for this environment) ==========
@@ -41,14 +67,32 @@ class LoginResponse(BaseModel):
     is_admin: bool
 
 
+# ===================== Pagination =====================
+def _after_cursor(filter_q: dict, after_id: Optional[str]) -> dict:
+    # Keyset pagination on _id (newest first): resume strictly below the last id served
+    if after_id is not None:
+        if not ObjectId.is_valid(after_id):
+            raise HTTPException(400, "Invalid cursor")
+        filter_q["_id"] = {"$lt": ObjectId(after_id)}
+    return filter_q
+
+
+def _page(docs: List[dict], limit: int) -> dict:
+    return {"items": docs, "next_cursor": docs[-1]["_id"] if len(docs) == limit else None}
+
+
+def _cached_response(payload: bytes) -> Response:
+    return Response(content=payload, media_type="application/json")
+
+
 # ===================== Public Endpoints =====================
 @app.get("/")
-def root():
+async def root():
     return {"message": "Food Court Ordering API running"}
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -61,38 +105,36 @@ def test_database():
         if db is not None:
             response["database"] = "✅ Available"
             response["connection_status"] = "Connected"
-            response["collections"] = db.list_collection_names()
+            response["collections"] = await db.list_collection_names()
         else:
             response["database"] = "⚠️  Available but not initialized"
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:80]}"
-    response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-    response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
+    response["database_url"] = "✅ Set" if DATABASE_URL else "❌ Not Set"
+    response["database_name"] = "✅ Set" if DATABASE_NAME else "❌ Not Set"
     return response
 
 
 # ===================== Auth =====================
 @app.post("/auth/signup", response_model=LoginResponse)
-def signup(payload: SignupRequest):
-    # Check existing user
-    existing = get_documents("user", {"email": payload.email}, limit=1)
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    password_hash = pwd_context.hash(payload.password)
+async def signup(payload: SignupRequest):
+    password_hash = await asyncio.to_thread(pwd_context.hash, payload.password)
     user = User(name=payload.name, email=payload.email, password_hash=password_hash)
-    user_id = create_document("user", user)
+    # Single upsert both checks for and creates the user, so concurrent signups can't duplicate an email
+    user_id = await create_document_if_absent("user", {"email": payload.email}, user)
+    if user_id is None:
+        raise HTTPException(status_code=400, detail="Email already registered")
     return LoginResponse(user_id=user_id, name=user.name, email=user.email, is_admin=user.is_admin)
 
 
 @app.post("/auth/login", response_model=LoginResponse)
-def login(payload: LoginRequest):
-    users = get_documents("user", {"email": payload.email}, limit=1)
-    if not users:
+async def login(payload: LoginRequest):
+    user = await get_document("user", {"email": payload.email}, {"_id": 1, "name": 1, "password_hash": 1, "is_admin": 1})
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    user = users[0]
-    if not pwd_context.verify(payload.password, user["password_hash"]):
+    if not await asyncio.to_thread(pwd_context.verify, payload.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    return LoginResponse(user_id=user["_id"], name=user["name"], email=user["email"], is_admin=user.get("is_admin", False))
+    return LoginResponse(user_id=user["_id"], name=user["name"], email=payload.email, is_admin=user.get("is_admin", False))
 
 
 # ===================== Categories =====================
@@ -103,30 +145,39 @@ class CategoryCreate(BaseModel):
 
 
 @app.get("/categories")
-def list_categories():
-    return get_documents("category", {"is_active": True}, sort=[["name", 1]])
+async def list_categories():
+    key = await cache_key("cats", "active")
+    cached = await cache_get(key)
+    if cached is not None:
+        return _cached_response(cached)
+    cats = await get_documents("category", {"is_active": True}, sort=[["name", 1]])
+    await cache_set(key, cats)
+    return cats
 
 
 @app.post("/admin/categories")
-def create_category(payload: CategoryCreate):
+async def create_category(payload: CategoryCreate):
     cat = Category(**payload.model_dump())
-    cat_id = create_document("category", cat)
+    cat_id = await create_document("category", cat)
+    await cache_invalidate("cats")
     return {"_id": cat_id}
 
 
 @app.put("/admin/categories/{category_id}")
-def update_category(category_id: str, payload: CategoryCreate):
-    ok = update_document("category", category_id, payload.model_dump())
+async def update_category(category_id: str, payload: CategoryCreate):
+    ok = await update_document("category", category_id, payload.model_dump())
     if not ok:
         raise HTTPException(404, "Category not found")
+    await cache_invalidate("cats")
     return {"updated": True}
 
 
 @app.delete("/admin/categories/{category_id}")
-def remove_category(category_id: str):
-    ok = delete_document("category", category_id)
+async def remove_category(category_id: str):
+    ok = await delete_document("category", category_id)
     if not ok:
         raise HTTPException(404, "Category not found")
+    await cache_invalidate("cats")
     return {"deleted": True}
 
 
@@ -141,16 +192,37 @@ class FoodItemCreate(BaseModel):
     is_available: bool = True
 
 
+def _normalize_item(data: dict) -> dict:
+    # Lowercased title/tags written alongside the item keep search index-friendly
+    data["title_lc"] = data["title"].lower()
+    data["tags"] = [t.lower() for t in data.get("tags") or []]
+    return data
+
+
 @app.get("/items")
-def list_items(q: Optional[str] = None, category: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None):
+async def list_items(q: Optional[str] = None, category: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                     limit: int = Query(50, ge=1, le=200), after_id: Optional[str] = None, exact: bool = False):
+    text_search = bool(q) and not exact and await has_text_index("fooditem")
+    # The search mode is part of the key so $text and prefix-fallback pages never share an entry
+    key = await cache_key("items", q, category, min_price, max_price, limit, after_id, exact, text_search)
+    cached = await cache_get(key)
+    if cached is not None:
+        return _cached_response(cached)
     filter_q = {"is_available": True}
     if category:
         filter_q["category_id"] = category
-    if q:
+    collation = None
+    if q and exact:
+        # Case-insensitive equality seeks the collated title index instead of running $regex with "i"
+        filter_q["title"] = q
+        collation = CASE_INSENSITIVE
+    elif text_search:
+        filter_q["$text"] = {"$search": q}
+    elif q:
+        q_lc = q.lower()
         filter_q["$or"] = [
-            {"title": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}},
-            {"tags": {"$elemMatch": {"$regex": q, "$options": "i"}}}
+            {"title_lc": {"$regex": f"^{re.escape(q_lc)}"}},
+            {"tags": q_lc},
         ]
     if min_price is not None or max_price is not None:
         price_filter = {}
@@ -159,37 +231,57 @@ def list_items(q: Optional[str] = None, category: Optional[str] = None, min_pric
         if max_price is not None:
             price_filter["$lte"] = max_price
         filter_q["price"] = price_filter
-    return get_documents("fooditem", filter_q, sort=[["title", 1]])
+    _after_cursor(filter_q, after_id)
+    docs = await get_documents("fooditem", filter_q, limit=limit, sort=[["_id", -1]], collation=collation)
+    page = _page(docs, limit)
+    await cache_set(key, page)
+    return page
 
 
 @app.get("/items/{item_id}")
-def get_item(item_id: str):
-    item = get_document_by_id("fooditem", item_id)
+async def get_item(item_id: str):
+    item = await get_document_by_id("fooditem", item_id)
     if not item:
         raise HTTPException(404, "Item not found")
     return item
 
 
 @app.post("/admin/items")
-def create_item(payload: FoodItemCreate):
-    item = Fooditem(**payload.model_dump())
-    item_id = create_document("fooditem", item)
+async def create_item(payload: FoodItemCreate):
+    item = Fooditem(**_normalize_item(payload.model_dump()))
+    item_id = await create_document("fooditem", item)
+    await cache_invalidate("items")
     return {"_id": item_id}
 
 
+@app.post("/admin/items/bulk")
+async def create_items(payload: List[FoodItemCreate]):
+    if not payload:
+        raise HTTPException(400, "No items given")
+    items = [Fooditem(**_normalize_item(p.model_dump())) for p in payload]
+    try:
+        item_ids = await create_documents("fooditem", items)
+    finally:
+        # An unordered insert_many can fail after inserting some documents
+        await cache_invalidate("items")
+    return {"_ids": item_ids}
+
+
 @app.put("/admin/items/{item_id}")
-def update_item(item_id: str, payload: FoodItemCreate):
-    ok = update_document("fooditem", item_id, payload.model_dump())
+async def update_item(item_id: str, payload: FoodItemCreate):
+    ok = await update_document("fooditem", item_id, _normalize_item(payload.model_dump()))
     if not ok:
         raise HTTPException(404, "Item not found")
+    await cache_invalidate("items")
     return {"updated": True}
 
 
 @app.delete("/admin/items/{item_id}")
-def delete_item(item_id: str):
-    ok = delete_document("fooditem", item_id)
+async def delete_item(item_id: str):
+    ok = await delete_document("fooditem", item_id)
     if not ok:
         raise HTTPException(404, "Item not found")
+    await cache_invalidate("items")
     return {"deleted": True}
 
 
@@ -215,18 +307,43 @@ class UpdateOrderStatusRequest(BaseModel):
     status: str
 
 
+_CART_ADAPTER = TypeAdapter(List[CartItem])
+
+
+def _order_subtotal(prices, quantities) -> float:
+    # map(operator.mul) keeps the multiply-accumulate in C rather than a generator frame
+    return sum(map(operator.mul, prices, quantities))
+
+
 @app.post("/orders")
-def create_order(payload: CreateOrderRequest):
+async def create_order(payload: CreateOrderRequest):
     if not payload.items:
         raise HTTPException(400, "Cart is empty")
-    subtotal = sum(i.price * i.quantity for i in payload.items)
+    if not all(ObjectId.is_valid(i.item_id) for i in payload.items):
+        raise HTTPException(400, "Invalid item id")
+    # Price the cart from the catalog in a single $in round-trip rather than trusting the client
+    ids = [ObjectId(i.item_id) for i in payload.items]
+    catalog = await get_documents("fooditem", {"_id": {"$in": ids}, "is_available": True}, projection={"price": 1, "title": 1})
+    catalog_map = {d["_id"]: d for d in catalog}
+    items = _CART_ADAPTER.dump_python(payload.items)
+    for line in items:
+        if line["quantity"] <= 0:
+            raise HTTPException(400, f"Invalid quantity for item {line['item_id']}")
+        # Normalize to the driver's lowercase hex so uppercase client ids still match
+        line["item_id"] = str(ObjectId(line["item_id"]))
+        entry = catalog_map.get(line["item_id"])
+        if entry is None:
+            raise HTTPException(400, f"Item {line['item_id']} is not available")
+        line["price"] = entry["price"]
+        line["title"] = entry["title"]
+    subtotal = _order_subtotal([line["price"] for line in items], [line["quantity"] for line in items])
     tax = round(subtotal * 0.08, 2)
     total = round(subtotal + tax, 2)
-    order_number = f"ORD-{str(ObjectId())[-6:].upper()}"
+    order_number = f"ORD-{await next_sequence('order'):08d}"
     order = Order(
         user_id=payload.user_id,
         order_number=order_number,
-        items=[i.model_dump() for i in payload.items],
+        items=items,
         subtotal=subtotal,
         tax=tax,
         total=total,
@@ -235,27 +352,29 @@ def create_order(payload: CreateOrderRequest):
         pickup_name=payload.pickup_name,
         notes=payload.notes,
     )
-    order_id = create_document("order", order)
+    order_id = await create_document("order", order)
     return {"_id": order_id, "order_number": order_number, "total": total}
 
 
 @app.get("/orders/{order_id}")
-def get_order(order_id: str):
-    order = get_document_by_id("order", order_id)
+async def get_order(order_id: str):
+    order = await get_document_by_id("order", order_id)
     if not order:
         raise HTTPException(404, "Order not found")
     return order
 
 
 @app.get("/orders")
-def list_orders(user_id: Optional[str] = None):
+async def list_orders(user_id: Optional[str] = None, limit: int = Query(50, ge=1, le=200), after_id: Optional[str] = None):
     filt = {"user_id": user_id} if user_id else {}
-    return get_documents("order", filt, sort=[["created_at", -1]])
+    _after_cursor(filt, after_id)
+    docs = await get_documents("order", filt, limit=limit, sort=[["_id", -1]])
+    return _page(docs, limit)
 
 
 @app.put("/admin/orders/{order_id}/status")
-def update_order_status(order_id: str, payload: UpdateOrderStatusRequest):
-    ok = update_document("order", order_id, {"status": payload.status})
+async def update_order_status(order_id: str, payload: UpdateOrderStatusRequest):
+    ok = await update_document("order", order_id, {"status": payload.status})
     if not ok:
         raise HTTPException(404, "Order not found")
     return {"updated": True}
@@ -263,7 +382,7 @@ def update_order_status(order_id: str, payload: UpdateOrderStatusRequest):
 
 # ===================== Schema Export for Docs =====================
 @app.get("/schema")
-def get_schema():
+async def get_schema():
     return {
         "collections": [
             "user",
@@ -278,4 +397,5 @@ def get_schema():
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Workers need an import string; one process per core lets bcrypt and BSON decode use every core
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=max(2, os.cpu_count() or 1), loop="uvloop", http="httptools")
@@ -26,11 +26,12 @@ class Category(BaseModel):
 
 class Fooditem(BaseModel):
     title: str = Field(..., description="Item title")
+    title_lc: Optional[str] = Field(None, description="Lowercased title for prefix search")
     description: Optional[str] = None
     price: float = Field(..., ge=0)
     category_id: str = Field(..., description="Reference to category _id")
     image_url: Optional[str] = None
-    tags: List[str] = []
+    tags: List[str] = Field([], description="Lowercase tags")
     is_available: bool = True
     rating: float = 0.0
 
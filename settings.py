@@ -0,0 +1,16 @@
+"""
+Environment Settings
+
+Loads the .env file once and exposes every setting the app reads as a module constant.
+Other modules import from here instead of calling load_dotenv()/os.getenv themselves.
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+DATABASE_NAME = os.environ.get("DATABASE_NAME")
+REDIS_URL = os.environ.get("REDIS_URL")